@@ -6,22 +6,48 @@ execute Python code, and query GitHub via an MCP server.
 
 The file intentionally keeps runtime components (like sessions and
 runners) lightweight by using in-memory implementations suitable for
-local development and testing.
+local development and testing; setting SPECTRA_PERSIST=1 switches them
+to a local SQLite database.
 """
 
 # Standard and third-party imports
-from google.adk.tools import AgentTool
+from google.adk.tools import AgentTool, FunctionTool, ToolContext
 from google.adk.agents import Agent
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.apps import App
+from google.adk.tools.mcp_tool.mcp_tool import McpTool
 from google.adk.tools.mcp_tool.mcp_toolset import (
     McpToolset,
     StreamableHTTPConnectionParams,
 )
 from google.adk.code_executors import BuiltInCodeExecutor
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import InMemoryRunner
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.adk.runners import InMemoryRunner, Runner
 from google.adk.tools import google_search
+from google.genai import types
 from dotenv import load_dotenv
+import httpx
+from collections import OrderedDict
+import ast
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
 import os
+import re
+import sqlite3
+import threading
+import time
+
+try:  # Optional: enables paraphrase matching in the tool result cache.
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables from a .env file (if present). This is how
 # sensitive values like API tokens can be provided during local testing.
@@ -30,9 +56,297 @@ load_dotenv()
 # toolset below to authenticate requests to the GitHub MCP server.
 GITHUB_AUTH_TOKEN = os.getenv("GITHUB_AUTH_TOKEN")
 
-# A simple built-in code executor provided by the ADK. It's used by the
-# helper `run_code` to execute Python code inside the ADK sandbox.
-executor = BuiltInCodeExecutor()
+# Model used by the root and search agents. Summarizing already-fetched
+# text is an easy task, so short summaries go to a smaller, cheaper model
+# (see `pick_model`); inputs longer than SUMMARIZER_MAX_CHARS still use the
+# default model.
+DEFAULT_MODEL = "gemini-2.5-flash"
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "gemini-2.5-flash-lite")
+SUMMARIZER_MAX_CHARS = 4_000
+
+
+@functools.cache
+def get_executor() -> BuiltInCodeExecutor:
+    """Return the shared ADK code executor, creating it on first use.
+
+    The executor is only needed once `run_code` is actually called, so it
+    is not built at import time.
+    """
+
+    return BuiltInCodeExecutor()
+
+
+@functools.cache
+def get_code_runner() -> InMemoryRunner:
+    """Return the runner for the agent that executes `run_code` snippets.
+
+    `BuiltInCodeExecutor` cannot run code by itself: it enables Gemini's
+    built-in code execution for the agent it is attached to, and the code
+    then runs in the model provider's sandbox.
+    """
+
+    code_agent = Agent(
+        name="CodeExecutorAgent",
+        model=DEFAULT_MODEL,
+        instruction=(
+            "Execute the Python code you are given exactly as written, "
+            "without changes, using code execution. Do not explain it."
+        ),
+        code_executor=get_executor(),
+    )
+    return InMemoryRunner(agent=code_agent, app_name="SpectraScoutCodeRunner")
+
+
+async def _execute_code(code: str) -> tuple[str, str]:
+    """Run `code` in the Gemini sandbox and return `(output, error)`."""
+
+    runner = get_code_runner()
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id="run_code"
+    )
+    message = types.Content(
+        role="user", parts=[types.Part(text=f"```python\n{code}\n```")]
+    )
+    outputs, error = [], ""
+    try:
+        async for event in runner.run_async(
+            user_id="run_code", session_id=session.id, new_message=message
+        ):
+            for part in (event.content and event.content.parts) or ():
+                result = part.code_execution_result
+                if result is None:
+                    continue
+                # Gemini may retry after a failed execution, so the last
+                # result decides the outcome.
+                if result.outcome == types.Outcome.OUTCOME_OK:
+                    outputs.append(result.output or "")
+                    error = ""
+                else:
+                    error = result.output or str(result.outcome)
+    finally:
+        await runner.session_service.delete_session(
+            app_name=runner.app_name, user_id="run_code", session_id=session.id
+        )
+
+    if not outputs and not error:
+        error = "The code was not executed."
+    return "".join(outputs), error
+
+
+# Seconds a GitHub MCP call may take before the agent falls back to web
+# search (see `_mcp_fallback`) instead of holding the turn. ADK retries a
+# failed McpTool call once, whatever the error, so each attempt gets half
+# of the budget.
+MCP_TIMEOUT_BUDGET = float(os.getenv("MCP_TIMEOUT_BUDGET", "3"))
+MCP_READ_TIMEOUT = MCP_TIMEOUT_BUDGET / 2
+# Session setup (connect, initialize) gets its own, more generous limit so
+# a slow handshake does not count against the per-call budget.
+MCP_CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "10"))
+
+# HTTP/2 needs the optional `h2` package (`pip install httpx[http2]`).
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _mcp_http_client(headers=None, timeout=None, auth=None) -> httpx.AsyncClient:
+    """Build the HTTP client used by the GitHub MCP session.
+
+    The MCP session keeps this client open for its lifetime, so every
+    tool call reuses the same pooled connection; with HTTP/2, concurrent
+    calls are multiplexed over one TCP/TLS stream instead of each paying
+    for its own handshake. Only HTTP/2 and the pool limits are added:
+    whatever mcp passes in is forwarded unchanged, and redirects are left
+    to mcp, which follows same-origin ones itself.
+    """
+
+    options = {"headers": headers, "timeout": timeout, "auth": auth}
+    return httpx.AsyncClient(
+        **{name: value for name, value in options.items() if value is not None},
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+
+class OptionalMcpToolset(McpToolset):
+    """McpToolset that offers no tools while the server is unreachable.
+
+    ADK lists every toolset's tools before each model call and aborts the
+    turn if listing fails, which would take down requests that never
+    touch GitHub. A failed listing is logged and treated as an empty
+    toolset instead, and retried on the next turn.
+    """
+
+    async def get_tools(self, readonly_context=None):
+        try:
+            return await super().get_tools(readonly_context)
+        except Exception as e:
+            logger.warning("GitHub MCP tools unavailable: %s", e)
+            return []
+
+
+@functools.cache
+def get_mcp_toolset() -> McpToolset:
+    """Return the shared GitHub MCP toolset.
+
+    McpToolset defers opening its streamable HTTP connection until the
+    tools are first listed, so building the toolset here is cheap; the
+    getter makes sure every caller shares one toolset and one session.
+    """
+
+    # We pass a streamable connection so the agent can receive SSE
+    # events or long-lived responses when supported by the backend.
+    return OptionalMcpToolset(
+        connection_params=StreamableHTTPConnectionParams(
+            url="https://api.githubcopilot.com/mcp/",
+            headers={"Authorization": GITHUB_AUTH_TOKEN},
+            timeout=MCP_CONNECT_TIMEOUT,
+            sse_read_timeout=MCP_READ_TIMEOUT,
+            httpx_client_factory=_mcp_http_client,
+        ),
+    )
+
+
+# `debug_code` results keyed by a BLAKE2b digest of the source. Agent
+# loops often re-send the same snippet across turns, so repeated calls
+# can skip parsing entirely; hashing keeps large sources out of the keys.
+_DEBUG_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_DEBUG_CACHE_SIZE = 512
+
+# `run_code` results keyed by a SHA-256 digest of the source, each stored
+# with the time it was produced. Every executor call is a sandbox round
+# trip, so repeated runs of the same deterministic snippet are served from
+# here until the entry is older than `RUN_CODE_CACHE_TTL` seconds.
+_RUN_CACHE: "OrderedDict[bytes, tuple[float, str]]" = OrderedDict()
+_RUN_CACHE_SIZE = 256
+RUN_CODE_CACHE_TTL = float(os.getenv("RUN_CODE_CACHE_TTL", "600"))
+
+# With SPECTRA_PERSIST=1, sessions and the `run_code`, search and
+# summarizer results are kept in a SQLite database so they survive
+# process restarts; otherwise everything stays in memory.
+SPECTRA_PERSIST = os.getenv("SPECTRA_PERSIST") == "1"
+SPECTRA_DB_PATH = os.path.expanduser(
+    os.getenv("SPECTRA_DB_PATH", "~/.spectrascout/sessions.db")
+)
+
+
+@functools.cache
+def _get_store() -> sqlite3.Connection | None:
+    """Open the persistent store, or return None when persistence is off.
+
+    The database is switched to WAL mode so the tool caches and the
+    session service can read and write it concurrently. `tool_cache`
+    holds `run_code` results, which share one TTL; `agent_tool_cache`
+    holds search and summarizer results, whose TTL varies per request,
+    so each row stores its own expiry time.
+    """
+
+    if not SPECTRA_PERSIST:
+        return None
+    os.makedirs(os.path.dirname(SPECTRA_DB_PATH), exist_ok=True)
+    store = sqlite3.connect(SPECTRA_DB_PATH, check_same_thread=False)
+    store.execute("PRAGMA journal_mode=WAL")
+    store.execute(
+        "CREATE TABLE IF NOT EXISTS tool_cache "
+        "(key BLOB PRIMARY KEY, created REAL NOT NULL, result TEXT NOT NULL)"
+    )
+    store.execute(
+        "CREATE TABLE IF NOT EXISTS agent_tool_cache "
+        "(key BLOB PRIMARY KEY, expires REAL NOT NULL, result TEXT NOT NULL)"
+    )
+    return store
+
+
+def _remember_run_result(key: bytes, timestamp: float, result: str) -> None:
+    """Add a `run_code` result to the in-memory LRU, keeping it bounded."""
+
+    _RUN_CACHE[key] = (timestamp, result)
+    _RUN_CACHE.move_to_end(key)
+    if len(_RUN_CACHE) > _RUN_CACHE_SIZE:
+        _RUN_CACHE.popitem(last=False)
+
+
+def _load_run_result(key: bytes) -> str | None:
+    """Return a persisted, unexpired `run_code` result for `key`."""
+
+    store = _get_store()
+    if store is None:
+        return None
+    row = store.execute(
+        "SELECT created, result FROM tool_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    age = time.time() - row[0]
+    if age >= RUN_CODE_CACHE_TTL:
+        with store:
+            store.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+        return None
+    # Re-enter the in-memory cache with the entry's remaining lifetime.
+    _remember_run_result(key, time.monotonic() - age, row[1])
+    return row[1]
+
+
+def _store_run_result(key: bytes, result: str) -> None:
+    """Persist a `run_code` result when persistence is enabled.
+
+    Expired rows are purged on each write so the table stays bounded by
+    what was produced within the last `RUN_CODE_CACHE_TTL` seconds.
+    """
+
+    store = _get_store()
+    if store is None:
+        return
+    now = time.time()
+    with store:
+        store.execute(
+            "DELETE FROM tool_cache WHERE created <= ?", (now - RUN_CODE_CACHE_TTL,)
+        )
+        store.execute(
+            "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?)", (key, now, result)
+        )
+
+
+def _load_tool_result(key: bytes) -> tuple[float, str] | None:
+    """Return `(seconds left, result)` for a persisted agent tool result."""
+
+    store = _get_store()
+    if store is None:
+        return None
+    row = store.execute(
+        "SELECT expires, result FROM agent_tool_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    remaining = row[0] - time.time()
+    if remaining <= 0:
+        with store:
+            store.execute("DELETE FROM agent_tool_cache WHERE key = ?", (key,))
+        return None
+    return remaining, row[1]
+
+
+def _store_tool_result(key: bytes, result: str, ttl: float) -> None:
+    """Persist an agent tool result for `ttl` seconds, purging expired rows."""
+
+    store = _get_store()
+    if store is None:
+        return
+    now = time.time()
+    with store:
+        store.execute("DELETE FROM agent_tool_cache WHERE expires <= ?", (now,))
+        store.execute(
+            "INSERT OR REPLACE INTO agent_tool_cache VALUES (?, ?, ?)",
+            (key, now + ttl, result),
+        )
+
+
+# Code that reads input, the clock, randomness, the environment, files,
+# processes or the network can produce a different result on every run,
+# so it is never cached.
+_NONDETERMINISTIC = re.compile(
+    r"\binput\s*\(|\bopen\s*\(|\bsys\s*\.\s*stdin\b"
+    r"|\b(?:random|time|datetime|uuid|secrets|os|subprocess|socket|urllib"
+    r"|requests|httpx|pathlib|shutil|tempfile)\b"
+)
 
 
 def debug_code(code: str) -> str:
@@ -51,10 +365,31 @@ def debug_code(code: str) -> str:
         A short string describing whether a syntax error was found or not.
     """
 
-    import ast
-
+    # surrogatepass keeps lone surrogates from failing the key itself;
+    # the parser then reports them like any other problem.
+    key = hashlib.blake2b(
+        code.encode("utf-8", "surrogatepass"), digest_size=16
+    ).digest()
+    cached = _DEBUG_CACHE.get(key)
+    if cached is not None:
+        _DEBUG_CACHE.move_to_end(key)
+        logger.debug("debug_code cache hit (%d bytes)", len(code))
+        return cached
+
+    result = _analyze_code(code)
+    _DEBUG_CACHE[key] = result
+    if len(_DEBUG_CACHE) > _DEBUG_CACHE_SIZE:
+        _DEBUG_CACHE.popitem(last=False)
+    return result
+
+
+def _analyze_code(code: str) -> str:
+    """Parse `code` and format the outcome for `debug_code`."""
+
+    # `compile` with PyCF_ONLY_AST runs the same C parser as `ast.parse`
+    # without the Python-level wrapper, and reports the same SyntaxError.
     try:
-        ast.parse(code)
+        compile(code, "<debug_code>", "exec", flags=ast.PyCF_ONLY_AST, dont_inherit=True)
         return "No syntax errors detected."
     except SyntaxError as e:
         return f"Syntax Error: {e.msg} at line {e.lineno}, column {e.offset}"
@@ -63,36 +398,337 @@ def debug_code(code: str) -> str:
         return f"Unexpected issue: {str(e)}"
 
 
-def run_code(code: str) -> str:
+async def run_code(code: str, use_cache: bool = True) -> str:
     """Execute Python code using the ADK `BuiltInCodeExecutor`.
 
-    This helper forwards `code` to the `executor` and formats the
-    result as a string. It avoids exposing low-level executor objects
-    to callers and makes it easy to embed execution as a tool for
-    higher-level agents.
+    This helper hands `code` to a small agent with the executor attached
+    (see `get_code_runner`) and formats the result as a string. It
+    avoids exposing low-level executor objects to callers and makes it
+    easy to embed execution as a tool for higher-level agents.
 
     Note: The executor runs in a sandboxed environment provided by the
     ADK; the exact isolation guarantees depend on the ADK runtime and
     should be reviewed before running untrusted code in production.
 
+    Results of snippets that look deterministic are cached for
+    `RUN_CODE_CACHE_TTL` seconds; code touching input, time, randomness,
+    the `os` module, files, subprocesses or the network always runs, and
+    failed runs are never cached.
+
     Args:
         code: Python source to run.
+        use_cache: Set to False to force a fresh execution, e.g. when the
+            code depends on external state not detected automatically.
 
     Returns:
         A string containing either the runtime error or the captured
         output from execution.
     """
 
-    result = executor.run(code)
-
-    if result.error:
-        return f"Runtime Error: {result.error}"
+    cacheable = use_cache and not _NONDETERMINISTIC.search(code)
+    if cacheable:
+        key = hashlib.sha256(code.encode("utf-8", "surrogatepass")).digest()
+        entry = _RUN_CACHE.get(key)
+        if entry is not None:
+            timestamp, cached = entry
+            if time.monotonic() - timestamp < RUN_CODE_CACHE_TTL:
+                _RUN_CACHE.move_to_end(key)
+                logger.debug("run_code cache hit (%d bytes)", len(code))
+                return cached
+            del _RUN_CACHE[key]
+        persisted = _load_run_result(key)
+        if persisted is not None:
+            logger.debug("run_code persistent cache hit (%d bytes)", len(code))
+            return persisted
+
+    result, error = await _execute_code(code)
+
+    if error:
+        output = f"Runtime Error: {error}"
     else:
-        return f"Output:\n{result.output}"
+        output = f"Output:\n{result}"
+
+    # Errors may be transient sandbox failures, so only successful runs
+    # are remembered.
+    if cacheable and not error:
+        _remember_run_result(key, time.monotonic(), output)
+        _store_run_result(key, output)
+    return output
+
+
+async def _fetch_applicant(tools: dict, username: str, tool_context: ToolContext) -> dict:
+    """Fetch one applicant's GitHub profile and repositories concurrently."""
+
+    profile, repositories = await asyncio.gather(
+        tools["search_users"].run_async(
+            args={"query": f"user:{username}"}, tool_context=tool_context
+        ),
+        tools["search_repositories"].run_async(
+            args={"query": f"user:{username} sort:updated"},
+            tool_context=tool_context,
+        ),
+    )
+    return {"username": username, "profile": profile, "repositories": repositories}
+
+
+async def compare_applicants(usernames: list[str], tool_context: ToolContext) -> dict:
+    """Fetch the public GitHub data of several job applicants at once.
+
+    Every applicant's profile and repository lookups are issued to the
+    GitHub MCP server concurrently, so comparing N applicants takes about
+    as long as fetching one.
+
+    Args:
+        usernames: GitHub usernames of the applicants to compare.
+
+    Returns:
+        A dict with one entry per applicant holding their profile and
+        repository search results, or the error that prevented fetching
+        them; a single "error" entry if the MCP server is unreachable.
+    """
+
+    try:
+        tools = {tool.name: tool for tool in await get_mcp_toolset().get_tools()}
+    except Exception as e:
+        # An exception escaping this tool would abort the whole turn;
+        # report it like a per-applicant error instead.
+        return {"error": f"GitHub MCP server unavailable: {e}"}
+    missing = {"search_users", "search_repositories"} - tools.keys()
+    if missing:
+        return {
+            "error": f"GitHub MCP server unavailable or lacks tools: {sorted(missing)}"
+        }
+
+    results = await asyncio.gather(
+        *(_fetch_applicant(tools, name, tool_context) for name in usernames),
+        return_exceptions=True,
+    )
+    return {
+        "applicants": [
+            {"username": name, "error": str(result)}
+            if isinstance(result, Exception)
+            else result
+            for name, result in zip(usernames, results)
+        ]
+    }
+
+
+# Sentence-embedding model used to match paraphrased tool requests. When
+# sentence-transformers is not installed the cache falls back to matching
+# requests that are identical after whitespace and case normalisation.
+EMBEDDING_MODEL = os.getenv(
+    "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+# Requests about reviews, complaints or news go stale quickly; company
+# reputation facts (existence, locations, people) change slowly.
+_VOLATILE_QUERY = re.compile(
+    r"\b(?:reviews?|complaints?|news|lawsuits?|cases?)\b", re.IGNORECASE
+)
+
+
+_EMBEDDER_LOCK = threading.Lock()
+
+
+def _get_embedder():
+    """Return the embedding model, or None if it is unavailable.
+
+    The model is loaded on first use; the lock makes concurrent first
+    calls share one load. A model that fails to load (e.g. no network to
+    download it) is treated like a missing package, so the cache keeps
+    working on normalized text instead of failing every tool call.
+    """
+
+    with _EMBEDDER_LOCK:
+        return _load_embedder()
+
+
+@functools.cache
+def _load_embedder():
+    if SentenceTransformer is None:
+        return None
+    try:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning("Could not load embedding model %s: %s", EMBEDDING_MODEL, e)
+        return None
+
+
+# Job titles a stage 3 check looks up one at a time; "CEO of Acme" and
+# "CFO of Acme" embed almost identically but need different answers.
+_ROLE_WORDS = frozenset(
+    "ceo cfo coo cto cio cmo vp hr recruiter recruiters founder founders "
+    "president chairman director manager".split()
+)
+
+
+def _entity_tokens(text: str) -> frozenset:
+    """Return the names, roles and numbers mentioned in a search query.
+
+    Capitalized words after the first, words containing digits and known
+    job titles are what tell otherwise similar queries apart, so two
+    queries may only share a cached result when these tokens agree.
+    """
+
+    words = re.findall(r"[\w'.-]+", text)
+    return frozenset(
+        word.lower()
+        for position, word in enumerate(words)
+        if word.lower() in _ROLE_WORDS
+        or any(ch.isdigit() for ch in word)
+        or (position and word[:1].isupper())
+    )
+
+
+class SemanticCache:
+    """Small similarity-keyed cache for free-text tool requests.
+
+    Each request is embedded and compared, by cosine similarity, with the
+    requests seen so far; a stored result is returned when the closest
+    one scores at least `threshold` and has not expired. Entries are
+    evicted oldest-first once `max_entries` is reached.
+
+    With `exact=True` requests are keyed by a SHA-256 digest instead and
+    only identical text matches; use this where near-identical inputs
+    must not share a result. A `guard` function narrows similarity
+    matches: only requests with the same guard value can match, e.g. the
+    same names and roles.
+
+    Loading the model and embedding requests are CPU-bound, so both run
+    in a worker thread to keep the event loop free for concurrent tool
+    calls.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 256,
+        exact: bool = False,
+        guard=None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.exact = exact
+        self.guard = guard
+        self._keys: list = []
+        self._tags: list = []
+        self._entries: list[tuple[float, object]] = []
+
+    async def _key(self, text: str):
+        if self.exact:
+            return hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()
+        embedder = await asyncio.to_thread(_get_embedder)
+        if embedder is None:
+            return " ".join(text.lower().split())
+        return await asyncio.to_thread(
+            embedder.encode, text, normalize_embeddings=True
+        )
+
+    def _tag(self, text: str):
+        return self.guard(text) if self.guard else None
+
+    def _find(self, key, tag) -> int | None:
+        candidates = [i for i, other in enumerate(self._tags) if other == tag]
+        if not candidates:
+            return None
+        if isinstance(key, (str, bytes)):
+            return next((i for i in candidates if self._keys[i] == key), None)
+        scores = np.stack([self._keys[i] for i in candidates]) @ key
+        best = int(scores.argmax())
+        return candidates[best] if scores[best] >= self.threshold else None
+
+    def _remove(self, index: int) -> None:
+        del self._keys[index], self._tags[index], self._entries[index]
+
+    async def get(self, text: str):
+        """Return the cached result for `text` or a close paraphrase."""
+
+        index = self._find(await self._key(text), self._tag(text))
+        if index is None:
+            return None
+        expires, result = self._entries[index]
+        if time.monotonic() >= expires:
+            self._remove(index)
+            return None
+        return result
+
+    async def put(self, text: str, result, ttl: float) -> None:
+        """Store `result` for `text` for `ttl` seconds."""
+
+        key, tag = await self._key(text), self._tag(text)
+        index = self._find(key, tag)
+        if index is not None:
+            self._remove(index)
+        elif len(self._keys) >= self.max_entries:
+            self._remove(0)
+        self._keys.append(key)
+        self._tags.append(tag)
+        self._entries.append((time.monotonic() + ttl, result))
+
+
+class _MemoizedDeclaration:
+    """Mixin that computes a tool's function declaration only once.
+
+    ADK asks every tool for its declaration on each model request, which
+    re-derives the JSON schema from the wrapped function or agent. The
+    declaration of these tools never changes, so the first one is kept.
+    """
+
+    _declaration = None
+
+    def _get_declaration(self):
+        if self._declaration is None:
+            self._declaration = super()._get_declaration()
+        return self._declaration
+
+
+class DeclaredFunctionTool(_MemoizedDeclaration, FunctionTool):
+    """FunctionTool with a memoized declaration."""
+
+
+class CachedAgentTool(_MemoizedDeclaration, AgentTool):
+    """AgentTool that answers repeated or paraphrased requests from cache.
+
+    The search agent is frequently asked near-identical questions across
+    stages and turns ("scam reports for X", "X scam reviews"); serving
+    those from a `SemanticCache` skips the sub-agent's model and search
+    round trips entirely.
+    """
+
+    def __init__(self, agent, cache: SemanticCache | None = None, **kwargs):
+        super().__init__(agent=agent, **kwargs)
+        self._cache = cache or SemanticCache()
+
+    async def run_async(self, *, args, tool_context):
+        request = str(args.get("request", args))
+        cached = await self._cache.get(request)
+        if cached is not None:
+            logger.debug("%s cache hit: %r", self.name, request[:80])
+            return cached
+
+        # With SPECTRA_PERSIST=1, results also survive restarts, keyed by
+        # a digest of the exact request.
+        key = hashlib.sha256(
+            f"{self.name}\0{request}".encode("utf-8", "surrogatepass")
+        ).digest()
+        persisted = _load_tool_result(key)
+        if persisted is not None:
+            remaining, result = persisted
+            logger.debug("%s persistent cache hit: %r", self.name, request[:80])
+            await self._cache.put(request, result, remaining)
+            return result
+
+        result = await super().run_async(args=args, tool_context=tool_context)
+        if result:
+            ttl = 3600 if _VOLATILE_QUERY.search(request) else 86400
+            await self._cache.put(request, result, ttl)
+            if isinstance(result, str):
+                _store_tool_result(key, result, ttl)
+        return result
+
 
 SearchAgent = Agent(
     name="SearchAgent",
-    model="gemini-2.5-flash",
+    model=DEFAULT_MODEL,
     instruction="You are a helpful agent that performs simple google searches.",
     description="Use this agent to perform simple google searches.",
     tools=[
@@ -100,16 +736,152 @@ SearchAgent = Agent(
     ]
 )
 
-seeker = AgentTool(agent=SearchAgent)
+# Paraphrased searches may share results, but only when they name the
+# same companies, people and roles.
+seeker = CachedAgentTool(agent=SearchAgent, cache=SemanticCache(guard=_entity_tokens))
+
+
+def pick_model(text_length: int, task: str) -> str:
+    """Choose the model for a request of `text_length` characters.
+
+    Short summarization requests are routed to `SUMMARIZER_MODEL`; any
+    other task, or a summary of long input, uses `DEFAULT_MODEL`.
+    """
+
+    if task == "summarize" and text_length < SUMMARIZER_MAX_CHARS:
+        return SUMMARIZER_MODEL
+    return DEFAULT_MODEL
+
+
+def _route_summary_model(callback_context, llm_request):
+    """before_model_callback that applies `pick_model` to each request."""
+
+    text_length = sum(
+        len(part.text or "")
+        for content in llm_request.contents
+        for part in content.parts or ()
+    )
+    llm_request.model = pick_model(text_length, "summarize")
+    return None
+
 
 summarizeAgent = Agent(
     name="SummarizeAgent",
-    model="gemini-2.5-flash",
+    model=SUMMARIZER_MODEL,
     instruction="You are a helpful agent that summarizes text content concisely.",
     description="Use this agent to summarize text content.",
+    before_model_callback=_route_summary_model,
 )
 
-summarizer = AgentTool(agent=summarizeAgent)
+# Summarizer inputs that differ only in a company name or a score embed
+# almost identically, and the cache is shared by every session, so only
+# byte-identical requests may reuse a summary.
+summarizer = CachedAgentTool(agent=summarizeAgent, cache=SemanticCache(exact=True))
+
+# Company/job scoring rubric. "max" is the best score for a step and
+# "penalty" the score given when the step's red flag applies; serialized
+# compactly into the static instruction below.
+RUBRIC = {
+    "stage1": {
+        "goal": "Company reputation via official site, web search, GitHub MCP",
+        "steps": [
+            {"id": 0, "name": "basics", "max": 0, "penalty": -10,
+             "check": "Scrape official site; penalty if none. Collect locations, achievements, reviews, clients, nationality, key employees (LinkedIn, roles)."},
+            {"id": 1, "name": "fraud", "max": 10,
+             "check": "Search scam/fraud reports; verify severity across sources. Criminal recruitment or confirmed severe fraud: 0, flag high-risk, list refs."},
+            {"id": 2, "name": "employee_reviews", "max": 5,
+             "check": "Current/former employee reviews; rate sentiment 1-5."},
+            {"id": 3, "name": "legal", "max": 5,
+             "check": "Employee complaints or legal cases; ongoing case: 0, else rate 1-5."},
+        ],
+    },
+    "stage2": {
+        "goal": "Verify locations",
+        "steps": [
+            {"id": 1, "name": "location", "max": 10,
+             "check": "Match posting location with official site and reputable search results or map links; unverified: 0."},
+            {"id": 2, "name": "other_sites", "max": 5,
+             "check": "Regional offices, corporate filings, business directories; score by reliability."},
+        ],
+    },
+    "stage3": {
+        "goal": "Company validity",
+        "steps": [
+            {"id": 1, "name": "presence", "max": 10,
+             "check": "Registrations, press coverage, corporate pages; score by strength of evidence."},
+            {"id": 2, "name": "key_people", "max": 15, "penalty": -20,
+             "check": "Verify professional profiles (LinkedIn etc.) of CEO, CFO, COO, HR, recruiters from the job site. Full if credible and tied to the company, less if missing or unrelated; penalty and strong flag if none verifiable."},
+        ],
+    },
+}
+
+def score_report(step_scores: dict[str, float]) -> dict:
+    """Total a company check's step scores against `RUBRIC`.
+
+    Each score is clamped to the range its rubric step allows (from the
+    step's penalty, if any, up to its max), so the totals in the final
+    report are always consistent with the rubric.
+
+    Args:
+        step_scores: Score per step, keyed "<stage>.<step name>", e.g.
+            {"stage1.fraud": 8, "stage3.key_people": 12}. Steps that are
+            not given, or whose score is not a number, count as 0.
+
+    Returns:
+        A dict with per-stage totals, the overall total, the best
+        possible total, any keys that do not match a rubric step and any
+        steps whose score could not be read as a number.
+    """
+
+    stages = {}
+    invalid = []
+    total = best = 0.0
+    for stage, spec in RUBRIC.items():
+        stage_total = 0.0
+        for step in spec["steps"]:
+            low = min(0, step.get("penalty", 0))
+            name = f"{stage}.{step['name']}"
+            try:
+                value = float(step_scores.get(name, 0))
+            except (TypeError, ValueError):
+                invalid.append(name)
+                value = 0.0
+            stage_total += min(max(value, low), step["max"])
+            best += step["max"]
+        stages[stage] = stage_total
+        total += stage_total
+
+    known = {
+        f"{stage}.{step['name']}"
+        for stage, spec in RUBRIC.items()
+        for step in spec["steps"]
+    }
+    return {
+        "stages": stages,
+        "total": total,
+        "max_total": best,
+        "unknown_steps": sorted(set(step_scores) - known),
+        "invalid_steps": invalid,
+    }
+
+
+# The scoring rubric never changes between turns, so it is sent as the
+# agent's static instruction: a stable prompt prefix that the model
+# provider can cache instead of re-processing on every turn. Only the
+# short `instruction` below travels with each request.
+static_instruction = (
+    """Company/job check: score each stage per RUBRIC using GitHub MCP, SearchAgent and scraping; summarize each stage with summarizer.
+Plan tool calls first: within a stage, emit all independent search, GitHub MCP and scrape calls in one response so they run concurrently; only wait for results a later call needs (stage1 step 0 key employees feed stage3 step 2). Calls for different stages may be batched too. Do not wait for a stage summary: call summarizer for a finished stage alongside the next stage's calls.
+Compute totals with score_report (keys "stage1.fraud" etc.). Final answer: summarizer report under 300 words with per-step score, totals, short reason and references, e.g. "S1.1 fraud 8/10 - no credible reports [refs]".
+RUBRIC="""
+    + json.dumps(RUBRIC, separators=(",", ":"))
+    + """
+
+If GitHub MCP tools are missing or return errors, use SearchAgent for those lookups instead.
+
+Applicant comparison (2+ GitHub usernames): fetch all public profiles and repos in one compare_applicants call, then use GitHub MCP only for extra detail (commits, READMEs); analyze activity, languages, project quality and complexity, contributions, collaboration, commit frequency, documentation, engineering practices. Score each on activity, complexity, documentation, collaboration, tech stack. Report each applicant's strengths and weaknesses, who is stronger in which area, a final ranking for the role, and friendly improvement suggestions.
+"""
+)
 
 instruction = """You are a friendly and helpful AI assistant. You can answer general questions, explain ideas,
 and help with day-to-day tasks.
@@ -119,43 +891,6 @@ You have access to:
 - debug_code (to find bugs in code)
 - run_code (to safely execute code)
 
-When asked about a company or job:
-Summarize the response after each STAGE using summarizer tool.
-STAGE 1 : Check the reputation of the company by using GitHub MCP, web search (via the SearchAgent / google_search), web-scraping, and a summarizer to confirm the company's existence and reviews. Follow the steps below and give points for each step as described (0 -> worst to n -> best).
-
-{
-Step 0 - Basics: Scrape the official website of the company offering the job. Give -10 points if it does not exist. Gather vital information such as locations, achievements, reviews, clients, nationality, and details of key employees (LinkedIn profiles, roles).
-Step 1 - 10 points: Search (via web search) for any scams or fraud reports related to the company. If you find reports, examine their severity by checking multiple sources and summarizing the findings. If there are criminal recruitment cases or severe, confirmed fraud across reliable sites, flag the response as high-risk, give 0 points for this step, and list the references.
-Step 2 - 5 points: Check reviews from current or former employees (e.g., GitHub discussions, public profiles, or other web sources) and rate overall employee sentiment from 1–5.
-Step 3 - 5 points: Look for employee complaints or ongoing legal cases between employees and the company. If there's an ongoing case, give 0 points; otherwise rate reputation from 1–5 based on evidence.
-}
-
-STAGE 2 : Verify company location and multiple site listings using the official website and supporting web search results (via SearchAgent / google_search). Cross-check locations mentioned on the job posting with addresses found on the official site and via web searches; use map links or authoritative pages found by search to corroborate addresses.
-{
-Step 1 - 10 points: Confirm the location(s) of the company by comparing the job posting location, official website, and reputable web search results. If location cannot be validated by these sources, give 0 points.
-Step 2 - 5 points: Check for other official or authoritative sites (e.g., regional offices, corporate filings, business directories) via web search and give points based on reliability.
-}
-
-STAGE 3 : Validity of the company
-{
-Step 1 - 10 points: Assess company validity by surveying internet presence (official registrations, press coverage, corporate pages) and award points according to the strength of evidence.
-Step 2 - 15 points: Check professional contact details of key employees (CEOs, CFOs, COOs, HR, recruiters) listed on the job site. Verify LinkedIn or other professional profiles via web search and summarizer. Give full points if credible profiles exist and clearly tie to the company (strong connections/followers); reduce points if profiles are missing or do not mention the company. Give -20 if no key employees have verifiable professional profiles and flag this strongly in the final report.
-}
-Return only the summarized report using summarizer include the scored breakdown, short reasoning for each score, and references used and give the output in less than 300 words.
-
-You can also compare GitHub profiles of multiple job applicants. When the user provides two or more GitHub usernames:
-
-1. Use the GitHub MCP server to fetch each applicant's public GitHub profile and repository information.
-2. Analyze their coding activity, languages used, project quality, contribution history, collaboration, commit frequency, documentation, and overall engineering practices.
-3. Identify strengths and weaknesses for each applicant, including which technologies they are better at.
-4. Score each applicant across categories such as activity, project complexity, documentation quality, collaboration, and tech stack strength.
-5. Produce a comparative report showing:
-   - Skill strengths of each applicant
-   - Which applicant is stronger in which skill or area
-   - A final ranking or summary describing who is better suited for the job or role
-6. Provide friendly, constructive suggestions for improvement for each applicant.
-
-
 When given code:
 - Use debug_code to identify issues.
 - Use run_code to test and show results.
@@ -166,36 +901,105 @@ For everything else:
 
 """
 
+def _mcp_fallback(tool, args, tool_context, tool_response):
+    """after_tool_callback that redirects failed MCP calls to search.
+
+    McpTool does not raise on timeouts or server errors; it returns a
+    response carrying an "error" message or the MCP "isError" flag. Such
+    responses get a note telling the model to retry the lookup with the
+    SearchAgent; every other response is left unchanged.
+    """
+
+    if not isinstance(tool, McpTool) or not isinstance(tool_response, dict):
+        return None
+    if not (tool_response.get("error") or tool_response.get("isError")):
+        return None
+    logger.warning("GitHub MCP tool %s failed: %s", tool.name, tool_response)
+    return {
+        **tool_response,
+        "fallback": "Answer this lookup with SearchAgent (web search) instead.",
+    }
+
+
+# The root agent's tools, wrapped once at import. Plain functions would be
+# re-wrapped in a new FunctionTool on every model request.
+ROOT_TOOLS = (
+    # McpToolset allows the agent to query GitHub-style MCP endpoints.
+    get_mcp_toolset(),
+    # Utility tools exposed to the agent:
+    DeclaredFunctionTool(debug_code),  # static analysis for Python source
+    DeclaredFunctionTool(run_code),  # sandboxed execution of Python code
+    DeclaredFunctionTool(score_report),  # rubric totals for company checks
+    DeclaredFunctionTool(compare_applicants),  # parallel GitHub profile fetch
+    seeker,  # search agent wrapped as a tool for web queries
+    summarizer,  # summarization helper wrapped as a tool
+)
 
 root_agent = Agent(
     name="GithubRepoInfoAgent",
-    model="gemini-2.5-flash",
+    model=DEFAULT_MODEL,
     description="An agent that provides Github repository information from the github API.",
+    static_instruction=static_instruction,
     instruction=instruction,
-    tools=[
-        # McpToolset allows the agent to query GitHub-style MCP endpoints.
-        # We pass a streamable connection so the agent can receive SSE
-        # events or long-lived responses when supported by the backend.
-        McpToolset(
-            connection_params=StreamableHTTPConnectionParams(
-                url="https://api.githubcopilot.com/mcp/",
-                headers={"Authorization": GITHUB_AUTH_TOKEN},
-                sse_read_timeout=10,
-            ),
-        ),
-        # Utility tools exposed to the agent:
-        debug_code,  # static analysis for Python source
-        run_code,  # sandboxed execution of Python code
-        seeker,  # search agent wrapped as a tool for web queries
-        summarizer,  # summarization helper wrapped as a tool
-    ],
+    tools=list(ROOT_TOOLS),
+    after_tool_callback=_mcp_fallback,
 )
 
 
-session_service = InMemorySessionService()
-runner = InMemoryRunner(agent=root_agent)
+# Wrapping the agent in an App enables Gemini context caching: the static
+# instruction and tool declarations are uploaded once as cached content
+# and reused by later turns until the cache expires.
+app = App(
+    name="SpectraScout",
+    root_agent=root_agent,
+    context_cache_config=ContextCacheConfig(
+        ttl_seconds=1800,
+        cache_intervals=20,
+    ),
+)
+
+
+@functools.cache
+def get_session_service() -> BaseSessionService:
+    """Return the shared session service, creating it on first use.
+
+    Sessions are kept in memory unless SPECTRA_PERSIST=1, in which case
+    they are stored in the SQLite database at SPECTRA_DB_PATH.
+    """
+
+    if _get_store() is None:
+        return InMemorySessionService()
+    # Imported here: it needs the optional SQLAlchemy/aiosqlite/greenlet
+    # dependencies, which in-memory use should not require.
+    from google.adk.sessions import DatabaseSessionService
+
+    return DatabaseSessionService(db_url=f"sqlite+aiosqlite:///{SPECTRA_DB_PATH}")
+
+
+@functools.cache
+def get_runner() -> Runner:
+    """Return the shared runner for `app`, creating it on first use."""
+
+    if not SPECTRA_PERSIST:
+        return InMemoryRunner(app=app)
+    return Runner(app=app, session_service=get_session_service())
+
+
+# By default the `session_service` and `runner` are simple in-memory
+# implementations to keep local testing lightweight; set SPECTRA_PERSIST=1
+# to keep sessions and cached tool results across restarts.
+#
+# `root_agent` and `app` stay module attributes because `adk web` looks
+# them up by name. The runtime objects are only built when first
+# accessed, either through the getters or these legacy attribute names.
+_LAZY_ATTRIBUTES = {
+    "executor": get_executor,
+    "session_service": get_session_service,
+    "runner": get_runner,
+}
+
 
-# The `session_service` and `runner` are intentionally simple in-memory
-# implementations to keep local testing lightweight. For production use
-# you would replace these with persisted/session-backed implementations
-# appropriate for the deployment environment.
\ No newline at end of file
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file